@@ -4,13 +4,14 @@ import asyncio
 import inspect
 import os
 import textwrap
+import zipfile
 from concurrent.futures.thread import ThreadPoolExecutor
-from contextlib import suppress
-from functools import partial
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
 
-import arrow
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from misty_py.apis import *
 from misty_py.misty_ws import MistyWS
@@ -19,10 +20,7 @@ from misty_py.utils import *
 
 log = init_log(__name__)
 
-with suppress(ModuleNotFoundError):
-    import uvloop
-
-    uvloop.install()
+install_fast_loop()
 
 __all__ = ('MistyAPI',)
 
@@ -59,24 +57,29 @@ class MistyAPI(RestAPI):
     =================================
     """
 
-    _pool = ThreadPoolExecutor(64)
+    # every worker thread should be able to hold onto its own pooled connection.
+    # otherwise, under load, urllib3 discards connections and we're back to a handshake per request
+    _max_connections = 64
+    _pool = ThreadPoolExecutor(_max_connections)
+    _download_chunk_size = 64 * 1024
+    _json_headers = {'Content-Type': 'application/json'}
+
+    # `requests` waits forever by default, tying up a worker thread whenever misty stops responding.
+    # applies to connecting and to each read, not the whole transfer, so large downloads are fine
+    timeout_secs: Optional[float] = 30.0
 
     def __init__(self, ip: Optional[str] = None):
         """either pass in ip directly or set in env"""
         self.ip = self._init_ip(ip)
+        self._base = f'{self.ip}/api/'
+        self._urls: Dict[str, str] = {}
+        self._prepared = TTLCache(64)
+        self._responses = TTLCache(64, ttl_secs=5)
+        self._in_flight: Dict[tuple, asyncio.Task] = {}
         self.ws = MistyWS(self)
-
-        # ==============================================================================================================
-        # PartialAPIs
-        # ==============================================================================================================
-
-        self.images = ImageAPI(self)
-        self.audio = AudioAPI(self)
-        self.faces = FaceAPI(self)
-        self.movement = MovementAPI(self)
-        self.system = SystemAPI(self)
-        self.navigation = NavigationAPI(self)
-        self.skills = SkillAPI(self)
+        # not closed on garbage collection: `MistyWS`'s instance cache keeps every api alive.
+        # use `close`/`aclose` (or `with`/`async with`) to release pooled connections
+        self._session = self._init_session()
 
         # ==============================================================================================================
         # SUBSCRIPTION DATA - store most recent subscription info here
@@ -84,39 +87,208 @@ class MistyAPI(RestAPI):
 
         self.subscription_data: Dict[Sub, SubPayload] = {}
 
+    # ==================================================================================================================
+    # PartialAPIs - created on first access and then stored directly on the instance
+    # ==================================================================================================================
+
+    @cached_property
+    def images(self) -> ImageAPI:
+        return ImageAPI(self)
+
+    @cached_property
+    def audio(self) -> AudioAPI:
+        return AudioAPI(self)
+
+    @cached_property
+    def faces(self) -> FaceAPI:
+        return FaceAPI(self)
+
+    @cached_property
+    def movement(self) -> MovementAPI:
+        return MovementAPI(self)
+
+    @cached_property
+    def system(self) -> SystemAPI:
+        return SystemAPI(self)
+
+    @cached_property
+    def navigation(self) -> NavigationAPI:
+        return NavigationAPI(self)
+
+    @cached_property
+    def skills(self) -> SkillAPI:
+        return SkillAPI(self)
+
     @staticmethod
     def _init_ip(ip):
         ip = ip or os.environ.get('MISTY_IP')
         if not ip:
             raise ValueError('You must provide an ip argument, or set $MISTY_IP in your env')
 
-        if not ip.startswith('http://') or ip.startswith('https://'):
+        if not ip.startswith(('http://', 'https://')):
             ip = f'http://{ip}'
         return ip
 
+    @classmethod
+    def _init_session(cls) -> requests.Session:
+        """
+        all calls go to the same host, so share one session to reuse connections via keep-alive
+        rather than paying for a new tcp handshake on every request
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=cls._max_connections,
+                              max_retries=Retry(total=2, backoff_factor=0.1))
+        for prefix in 'http://', 'https://':
+            session.mount(prefix, adapter)
+        session.headers.update({'User-Agent': 'misty_py', 'Connection': 'keep-alive'})
+        return session
+
+    def close(self):
+        """release any pooled connections. safe to call more than once"""
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def aclose(self):
+        """like `close`, but also wind down what partial apis keep going, e.g. actuator subs and delayed slam stops"""
+        if 'movement' in self.__dict__:
+            await self.movement.close()
+        if 'navigation' in self.__dict__:
+            await self.navigation.close()
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
     # ==================================================================================================================
     # REST CALLS
     # ==================================================================================================================
     def _endpoint(self, endpoint, **params) -> str:
-        res = f'{self.ip}/api/{endpoint}'
+        # there's a small, fixed set of endpoints, so just remember the urls
+        res = self._urls.get(endpoint)
+        if res is None:
+            res = self._urls[endpoint] = f'{self._base}{endpoint}'
 
         if params:
-            param_str = '&'.join(f'{k}={v}' for k, v in params.items())
-            res = f'{res}?{param_str}'
+            res = f'{res}?{urlencode(params, doseq=True)}'
 
         return res
 
     async def _request(self, method, endpoint, json=None, *, _headers: Optional[Dict[str, str]] = None, **params):
-        req_kwargs = json_obj.from_not_none(json=json, headers=_headers)
-        f = partial(requests.request, method, self._endpoint(endpoint, **params), **req_kwargs)
-        log.info(f'{method}: {self._endpoint(endpoint, **params)}')
-        return await asyncio.get_running_loop().run_in_executor(self._pool, f)
+        url = self._endpoint(endpoint, **params)
+        # %-style so the message is only formatted if INFO is actually enabled
+        log.info('%s: %s', method, url)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._send, method, url, json, _headers)
+
+    def _send(self, method, url, json, headers):
+        """blocking call to misty. run in `_pool`"""
+        if json is None:
+            return self._session.request(method, url, headers=headers, timeout=self.timeout_secs)
+
+        # serialize ourselves - `json_dumps` is faster than the stdlib encoder `requests` would use
+        try:
+            body = json_dumps(json)
+        except TypeError:
+            # something `json_dumps` can't handle, e.g. a non-str key. let `requests` deal with it
+            return self._session.request(method, url, json=json, headers=headers, timeout=self.timeout_secs)
+        headers = {**self._json_headers, **headers} if headers else self._json_headers
+        return self._session.request(method, url, data=body, headers=headers, timeout=self.timeout_secs)
+
+    async def _post_prepared(self, endpoint, json: Optional[dict] = None):
+        """
+        POST for payloads that are sent over and over, e.g. `halt` or setting the led to a particular color
+
+        the prepared request (parsed url, merged headers, encoded body) is only built the first time
+        """
+        body = None if json is None else json_dumps(json)
+        key = endpoint, body
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            prepared = self._prepared[key] = self._prepare_post(endpoint, body)
+        log.info('POST: %s', prepared[0].url)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._send_prepared, *prepared)
+
+    def _prepare_post(self, endpoint, body: Optional[bytes]):
+        headers = self._json_headers if body is not None else None
+        req = requests.Request('POST', self._endpoint(endpoint), data=body, headers=headers)
+        prepared = self._session.prepare_request(req)
+        settings = self._session.merge_environment_settings(prepared.url, {}, None, None, None)
+        return prepared, settings
+
+    def _send_prepared(self, prepared: requests.PreparedRequest, settings):
+        """blocking call to misty. run in `_pool`"""
+        return self._session.send(prepared.copy(), timeout=self.timeout_secs, **settings)
 
     async def _get(self, endpoint, *, _headers=None, **params):
         return await self._request('GET', endpoint, **params, _headers=_headers)
 
-    async def _get_j(self, endpoint, *, _headers=None, **params) -> JSONObjOrObjs:
-        return json_obj((await self._get(endpoint, **params, _headers=_headers)).json()['result'])
+    async def _get_j(self, endpoint, *, _headers=None, _cache=False, **params) -> JSONObjOrObjs:
+        """
+        `_cache`: reuse a response received in the last few seconds, if any.
+        concurrent callers share a single in-flight request rather than each making their own
+
+        cached responses are kept as parsed json and wrapped anew for every caller,
+        so mutating a result can't change what anyone else gets
+        """
+        if _cache:
+            key = endpoint, frozenset(params.items())
+            res = self._responses.get(key)
+            if res is None:
+                task = self._in_flight.get(key)
+                if task is None:
+                    coro = self._fetch_cached(key, endpoint, _headers, params)
+                    task = self._in_flight[key] = asyncio.create_task(coro)
+                # one caller being cancelled shouldn't cancel the request for everyone else
+                res = await asyncio.shield(task)
+            return json_obj(res)
+
+        return json_obj(await self._get_result(endpoint, _headers, params))
+
+    async def _get_result(self, endpoint, headers, params):
+        """the parsed, unwrapped `result` of a GET"""
+        return json_loads((await self._get(endpoint, **params, _headers=headers)).content)['result']
+
+    async def _fetch_cached(self, key, endpoint, headers, params):
+        try:
+            res = await self._get_result(endpoint, headers, params)
+            # only cache if the data wasn't invalidated while we were waiting
+            if self._in_flight.get(key) is asyncio.current_task():
+                self._responses[key] = res
+            return res
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+
+    def _clear_cached_response(self, endpoint, **params):
+        """call when misty's data has changed, e.g. after uploading an image, to stop serving stale responses"""
+        key = endpoint, frozenset(params.items())
+        self._responses.pop(key)
+        self._in_flight.pop(key, None)
+
+    async def _download(self, endpoint, outfile: str, *, _headers=None, **params) -> requests.Response:
+        """GET, streaming a (potentially large) response body straight to `outfile` instead of holding it in memory"""
+        url = self._endpoint(endpoint, **params)
+        log.info('GET: %s -> %s', url, outfile)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._send_to_file, url, outfile, _headers)
+
+    def _send_to_file(self, url, outfile, headers):
+        """blocking call to misty. run in `_pool`"""
+        with self._session.get(url, headers=headers, stream=True, timeout=self.timeout_secs) as res:
+            if res.ok:
+                with open(outfile, 'wb') as f:
+                    for chunk in res.iter_content(self._download_chunk_size):
+                        f.write(chunk)
+            else:
+                # read the error body before the connection goes back to the pool
+                res.content
+        return res
 
     async def _post(self, endpoint, json: Optional[dict] = None, *, _headers=None, **params):
         return await self._request('POST', endpoint, **params, json=json, _headers=_headers)
@@ -124,23 +296,40 @@ class MistyAPI(RestAPI):
     async def _delete(self, endpoint, json: Optional[dict] = None, *, _headers=None, **params):
         return await self._request('DELETE', endpoint, **params, json=json, _headers=_headers)
 
+    async def batch(self, *calls: Tuple):
+        """
+        issue several REST calls at once, where each call is `(method, endpoint, params, json)`.
+        trailing `params`/`json` can be left off. e.g.:
+        >>> await api.batch(('GET', 'images/list'), ('POST', 'led', None, RGB(0, 0, 255).json))
+
+        misty has no batch endpoint, so calls are dispatched concurrently over the shared connection pool.
+        responses are returned in the order the calls were passed in
+        """
+        # pad each call out to all four elements
+        calls = ((tuple(c) + (None, None))[:4] for c in calls)
+        coros = (self._request(method, endpoint, json, **(params or {})) for method, endpoint, params, json in calls)
+        return await asyncio.gather(*coros)
+
+    async def prefetch(self):
+        """
+        populate `saved_images`, `saved_audio`, and `saved_faces` and warm the battery/device info caches concurrently
+
+        total time is that of the slowest call rather than the sum of all of them.
+        call once after construction - `__init__` itself never blocks on the network
+        """
+        await asyncio.gather(self.images.list(), self.audio.list(), self.faces.list(),
+                             self.system.battery_info, self.system.device_info)
+
     async def dump_debug_info(self):
+        import arrow
         cur_date = arrow.now().format('YYYYMMDD')
         path = f'/tmp/{cur_date}.cushner.'
-        t = await self.system.device_info
-        di = path + 'device_info'
-        with open(di, 'w') as f:
-            f.write(t.pretty)
-
-        t = await self.system.get_logs(arrow.utcnow().shift(hours=-7))
-        l = path + 'log'
-        with open(l, 'w') as f:
-            f.write(t)
-
+        device_info, logs = await asyncio.gather(self.system.device_info,
+                                                 self.system.get_logs(arrow.utcnow().shift(hours=-7)))
         z = path + 'misty.zip'
-        with suppress(FileNotFoundError):
-            os.remove(z)
-        os.system(f'zip {z} {di} {l}')
+        # file io and compression would block the loop, so do them in the pool
+        await asyncio.get_running_loop().run_in_executor(
+            self._pool, _write_debug_zip, z, {path + 'device_info': device_info.pretty, path + 'log': logs})
         print('created', z)
 
     def __eq__(self, other):
@@ -150,6 +339,15 @@ class MistyAPI(RestAPI):
         return hash(self.ip)
 
 
+def _write_debug_zip(zip_path, name_to_contents: Dict[str, str]):
+    """write each file to disk and bundle them all into a fresh zip at `zip_path`"""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, contents in name_to_contents.items():
+            with open(name, 'w') as f:
+                f.write(contents)
+            zf.write(name)
+
+
 def _run_example():
     """
     example function showing how misty can be used
@@ -187,11 +385,10 @@ def _create_api_doc():
 
 MistyAPI.__doc__ = MistyAPI.__doc__.format(partial_api_section=_create_api_doc(),
                                            usage_section='\n    '.join(inspect.getsource(_run_example).splitlines()))
-help(MistyAPI)
 
 
 def __main():
-    return
+    help(MistyAPI)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,11 @@
 import asyncio
-from functools import wraps
 from io import BytesIO
 from typing import Dict, Optional
 
 from misty_py.apis.base import PartialAPI, write_outfile, print_pretty, AUDIO_SIZE_LIMIT
 from misty_py.misty_ws import EventCallback
 from misty_py.subscriptions import SubPayload, SubType, HandlerType
-from misty_py.utils import json_obj, generate_upload_payload, delay, wait_first
+from misty_py.utils import json_obj, generate_upload_payload, delay, wait_first, TTLCache, clamp, fire_and_forget
 
 __author__ = 'acushner'
 
@@ -17,12 +16,36 @@ class AudioAPI(PartialAPI):
     def __init__(self, api):
         super().__init__(api)
         self.saved_audio = json_obj()
+        # audio files can be up to `AUDIO_SIZE_LIMIT`, so keep fewer of these around than images
+        self._get_cache = TTLCache(8, ttl_secs=300)
+        self._stop_recording_timer: Optional[asyncio.TimerHandle] = None
+        self._recording_file_name: Optional[str] = None
 
     async def get(self, file_name: str, outfile='', *, as_base64=False) -> BytesIO:
-        """download an audio file from misty"""
-        res = await self._get('audio', FileName=file_name, Base64=as_base64)
-        write_outfile(outfile, res.content, as_base64)
-        return BytesIO(res.content)
+        """
+        download an audio file from misty
+
+        files are cached for a few minutes. uploading/deleting/recording a file will clear it from the cache
+        """
+        key = file_name, as_base64
+        content = self._get_cache.get(key)
+        if content is None:
+            res = await self._get('audio', FileName=file_name, Base64=as_base64)
+            content = res.content
+            if res.ok:
+                self._get_cache[key] = content
+
+        write_outfile(outfile, content, as_base64)
+        return BytesIO(content)
+
+    def _clear_cached(self, file_name: str):
+        """
+        call both before and after writing `file_name`:
+        a `get`/`list` that runs while the write is in flight would otherwise re-cache the old content
+        """
+        for as_base64 in True, False:
+            self._get_cache.pop((file_name, as_base64))
+        self.api._clear_cached_response('audio/list')
 
     async def list(self, pretty=False) -> Dict[str, json_obj]:
         """
@@ -30,7 +53,7 @@ class AudioAPI(PartialAPI):
         store in `self.saved_audio`
         return dict
         """
-        audio = await self._get_j('audio/list')
+        audio = await self._get_j('audio/list', _cache=True)
         res = self.saved_audio = json_obj((a.name, a) for a in audio)
         if pretty:
             print_pretty(res)
@@ -51,7 +74,9 @@ class AudioAPI(PartialAPI):
         """
         payload = generate_upload_payload(prefix, file_path, False, overwrite_existing, limit=AUDIO_SIZE_LIMIT,
                                           data=data)
+        self._clear_cached(payload.FileName)
         res = await self._post('audio', payload)
+        self._clear_cached(payload.FileName)
         if apply_immediately:
             await self.play(payload.FileName)
         return res
@@ -63,7 +88,7 @@ class AudioAPI(PartialAPI):
         use `how_long_secs` to interrupt audio after a certain amount of time has elapsed
         use `blocking` to indicate that this call should not complete until audio is done playing
         """
-        payload = dict(FileName=name, Volume=min(max(volume, 1), 100))
+        payload = dict(FileName=name, Volume=clamp(volume, 1, 100))
         res = await self._post('audio/play', payload)
         if res.ok:
             await self._handle_blocking_play_call(name, how_long_secs, blocking)
@@ -78,16 +103,14 @@ class AudioAPI(PartialAPI):
         - do nothing
         """
 
+        stop = delay(how_long_secs, self.stop_playing()) if how_long_secs else None
+        if not blocking:
+            return fire_and_forget(stop) if stop else None
+
         try:
-            tasks = []
-            if blocking:
-                tasks.append(self._handle_audio_complete(name))
-            if how_long_secs:
-                tasks.append(delay(how_long_secs, self.stop_playing()))
-
-            if tasks:
-                t = asyncio.create_task(wait_first(*tasks))
-                return await t if blocking else t
+            completed = self._handle_audio_complete(name)
+            # only race the two when there's a timed stop - otherwise just wait for the song
+            return await (wait_first(completed, stop) if stop else completed)
         except asyncio.CancelledError:
             await asyncio.shield(self.stop_playing())
             raise
@@ -112,43 +135,59 @@ class AudioAPI(PartialAPI):
 
     async def delete(self, file_name: str):
         """rm a filename from misty"""
-        return await self._delete('audio', dict(FileName=file_name))
+        self._clear_cached(file_name)
+        res = await self._delete('audio', dict(FileName=file_name))
+        self._clear_cached(file_name)
+        return res
 
     async def set_default_volume(self, volume):
         """set system-wide default volume"""
-        return await self._post('audio/volume', dict(Volume=min(max(volume, 0), 100)))
+        return await self._post('audio/volume', dict(Volume=clamp(volume, 0, 100)))
 
     async def _handle_blocking_record_call(self, how_long_secs, blocking):
         if blocking and not how_long_secs:
             raise ValueError('if you want to block, must provide `how_long_secs`')
 
+        if not how_long_secs:
+            return
+
         # limited here due to misty API specs
-        how_long_secs = min(max(how_long_secs, 0), 60)
-        coro = delay(how_long_secs, self.stop_recording())
+        how_long_secs = clamp(how_long_secs, 0, 60)
         if blocking:
-            await coro
+            await delay(how_long_secs, self.stop_recording())
         else:
-            asyncio.create_task(coro)
+            self._stop_recording_timer = self._call_later(how_long_secs, self.stop_recording)
 
     async def record(self, filename: str, how_long_secs: Optional[float] = None, blocking=False):
         """record audio"""
-        fn = f'{filename.rstrip(".wav")}.wav'
+        # `rstrip` would eat any trailing '.', 'w', 'a', or 'v' chars, e.g. 'java' -> 'j'
+        fn = filename if filename.endswith('.wav') else f'{filename}.wav'
+        self._clear_cached(fn)
+        self._cancel_stop_recording_timer()
         res = await self._post('audio/record/start', json_obj(FileName=fn))
+        # the file isn't written until recording stops, so `stop_recording` clears it again then
+        self._recording_file_name = fn
         await self._handle_blocking_record_call(how_long_secs, blocking)
         return res
 
     async def stop_recording(self):
         """stop recording audio"""
-        await self._post('audio/record/stop')
+        # stopping manually shouldn't leave an earlier timed stop pending - it'd cut off the next recording
+        self._cancel_stop_recording_timer()
+        await self._post_prepared('audio/record/stop')
+        if self._recording_file_name:
+            self._clear_cached(self._recording_file_name)
+            self._recording_file_name = None
+
+    def _cancel_stop_recording_timer(self):
+        if self._stop_recording_timer:
+            self._stop_recording_timer.cancel()
+            self._stop_recording_timer = None
 
     async def start_key_phrase_recognition(self, on_recognition: HandlerType):
-        @wraps(on_recognition)
-        async def _wrapper(sp: SubPayload):
-            asyncio.create_task(sp.sub_id.unsubscribe())
-            return await on_recognition(sp)
-
-        await self.api.ws.subscribe(SubType.key_phrase_recognized, _wrapper)
-        await self._post('audio/keyphrase/start')
+        # recognition can't fire until someone speaks, so start it while subscribing rather than after
+        await asyncio.gather(self.api.ws.subscribe(SubType.key_phrase_recognized, on_recognition, once=True),
+                             self._post('audio/keyphrase/start'))
 
     async def wait_for_key_phrase(self):
         async def _wait_one(_: SubPayload):
@@ -159,7 +198,7 @@ class AudioAPI(PartialAPI):
         await ecb
 
     async def stop_key_phrase_recognition(self):
-        await self._post('audio/keyphrase/stop')
+        await self._post_prepared('audio/keyphrase/stop')
         await self.api.ws.unsubscribe(SubType.key_phrase_recognized)
 
 
@@ -1,7 +1,8 @@
-from base64 import b64decode
-from typing import Optional
+import asyncio
+from typing import Optional, List, Callable, Coroutine
 
-from misty_py.utils import RestAPI, JSONObjOrObjs, json_obj
+from misty_py.utils import RestAPI, JSONObjOrObjs, json_obj, fire_and_forget
+from misty_py.utils.core import b64decode
 
 __author__ = 'acushner'
 
@@ -29,7 +30,7 @@ class PartialAPI(RestAPI):
 
     separate out methods into logical groups such as face, image, audio, etc
     """
-    _registered_classes = set()  # only used for MistyAPI's __doc__
+    _registered_classes: List[type] = []  # only used for MistyAPI's __doc__. a list so the doc's order is stable
 
     def __init__(self, api):
         from misty_py.api import MistyAPI
@@ -37,20 +38,36 @@ class PartialAPI(RestAPI):
 
     def __init_subclass__(cls, **kwargs):
         if not cls.__name__.startswith('_'):
-            cls._registered_classes.add(cls)
+            cls._registered_classes.append(cls)
 
     async def _get(self, endpoint, *, _headers=None, **params):
         return await self.api._get(endpoint, _headers=_headers, **params)
 
-    async def _get_j(self, endpoint, *, _headers=None, **params) -> JSONObjOrObjs:
-        return await self.api._get_j(endpoint, _headers=_headers, **params)
+    async def _get_j(self, endpoint, *, _headers=None, _cache=False, **params) -> JSONObjOrObjs:
+        return await self.api._get_j(endpoint, _headers=_headers, _cache=_cache, **params)
+
+    async def _download(self, endpoint, outfile: str, *, _headers=None, **params):
+        return await self.api._download(endpoint, outfile, _headers=_headers, **params)
 
     async def _post(self, endpoint, json: Optional[dict] = None, *, _headers=None, **params):
         return await self.api._post(endpoint, json, _headers=_headers, **params)
 
+    async def _post_prepared(self, endpoint, json: Optional[dict] = None):
+        return await self.api._post_prepared(endpoint, json)
+
     async def _delete(self, endpoint, json: Optional[dict] = None, *, _headers=None, **params):
         return await self.api._delete(endpoint, json, _headers=_headers, **params)
 
+    @staticmethod
+    def _call_later(delay_secs: float, coro_func: Callable[[], Coroutine]) -> asyncio.TimerHandle:
+        """
+        run `coro_func()` after `delay_secs`
+
+        unlike a task sleeping in `delay`, nothing is kept alive in the meantime.
+        the returned handle can be cancelled
+        """
+        return asyncio.get_running_loop().call_later(delay_secs, lambda: fire_and_forget(coro_func()))
+
 
 def __main():
     pass
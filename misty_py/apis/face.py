@@ -16,19 +16,23 @@ class FaceAPI(PartialAPI):
     def __init__(self, api):
         super().__init__(api)
         self.saved_faces = set()
+        self._stop_all: Optional[asyncio.Future] = None
 
     async def list(self, pretty=False) -> Set[str]:
-        res = self.saved_faces = set(await self._get_j('faces'))
+        res = self.saved_faces = set(await self._get_j('faces', _cache=True))
         if pretty:
             print_pretty(res)
         return res
 
     async def delete(self, *, name: Optional[str] = None, delete_all: bool = False):
         """rm face[s] from misty"""
-        if bool(delete_all) + bool(name) != 1:
+        # an empty name would send no FaceId, i.e. delete every face, so treat it as unset
+        if bool(name) == bool(delete_all):
             raise ValueError('set exactly one of `name` or `delete_all`')
 
         await self._delete('faces', **(dict(FaceId=name) if name else {}))
+        # only once misty's done: a `list` running during the delete would re-cache the old faces
+        self.api._clear_cached_response('faces')
 
     async def start_detection(self):
         """
@@ -38,15 +42,17 @@ class FaceAPI(PartialAPI):
 
     async def stop_detection(self):
         """stop finding/detecting faces in misty's line of vision"""
-        await self._post('faces/detection/stop')
+        await self._post_prepared('faces/detection/stop')
 
     async def start_training(self, face_id: str):
         """start training a particular face"""
-        return await self._post('faces/training/start', dict(FaceId=face_id))
+        res = await self._post('faces/training/start', dict(FaceId=face_id))
+        self.api._clear_cached_response('faces')
+        return res
 
     async def stop_training(self):
         """stop training a particular face"""
-        return await self._post('faces/training/stop')
+        return await self._post_prepared('faces/training/stop')
 
     async def wait_for_training(self, face_id: str):
         """blocking call to wait for face training"""
@@ -57,15 +63,19 @@ class FaceAPI(PartialAPI):
             return m == FTMsgs.complete.value
 
         ecb = EventCallback(_wait)
-        async with self.api.ws.sub_unsub(SubType.face_training, ecb):
-            await asyncio.gather(
-                self.start_training(face_id),
-                ecb
-            )
+        # training takes seconds, so kick it off while the websocket subscription is being set up
+        start = asyncio.create_task(self.start_training(face_id))
+        try:
+            async with self.api.ws.sub_unsub(SubType.face_training, ecb):
+                await asyncio.gather(start, ecb)
+        except BaseException:
+            start.cancel()
+            raise
+        self.api._clear_cached_response('faces')
 
     async def cancel_training(self):
         """shouldn't need to call unless you want to manually stop something in progress"""
-        return await self._post('faces/training/cancel')
+        return await self._post_prepared('faces/training/cancel')
 
     async def start_recognition(self):
         """start attempting to recognize faces"""
@@ -73,10 +83,13 @@ class FaceAPI(PartialAPI):
 
     async def stop_recognition(self):
         """stop attempting to recognize faces"""
-        return await self._post('faces/recognition/stop')
+        return await self._post_prepared('faces/recognition/stop')
 
     async def stop_all(self):
-        return await asyncio.gather(self.stop_training(), self.cancel_training(), self.stop_recognition())
+        """stop training and recognition. calls made while a `stop_all` is in flight just wait on that one"""
+        if self._stop_all is None or self._stop_all.done():
+            self._stop_all = asyncio.gather(self.stop_training(), self.cancel_training(), self.stop_recognition())
+        return await asyncio.shield(self._stop_all)
 
 
 def __main():
@@ -1,11 +1,11 @@
 import asyncio
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from io import BytesIO
 from typing import Dict, Optional, NamedTuple, Union
 
 from misty_py.apis.base import PartialAPI, print_pretty, write_outfile
-from misty_py.utils import save_data_locally, json_obj, generate_upload_payload, RGB, delay
-from misty_py.utils.core import decode_data
+from misty_py.utils import save_data_locally, json_obj, generate_upload_payload, RGB, TTLCache, clamp, drop_none
 
 __author__ = 'acushner'
 
@@ -32,12 +32,21 @@ class BlinkSettings(NamedTuple):
         )
 
 
+@lru_cache(maxsize=256)
+def _led_json(rgb: RGB) -> dict:
+    """animations tend to cycle through the same few colors, so only validate/build each payload once"""
+    rgb.validate()
+    return rgb.json
+
+
 class ImageAPI(PartialAPI):
     """handle pics, video, uploading/downloading images, changing led color, etc"""
 
     def __init__(self, api):
         super().__init__(api)
         self.saved_images = json_obj()
+        self._get_cache = TTLCache(64, ttl_secs=300)
+        self._stop_video_timer: Optional[asyncio.TimerHandle] = None
 
     @staticmethod
     def save_image_locally(path, data: BytesIO):
@@ -53,7 +62,7 @@ class ImageAPI(PartialAPI):
         store in `self.saved_images`
         return dict
         """
-        images = await self._get_j('images/list')
+        images = await self._get_j('images/list', _cache=True)
         res = self.saved_images = json_obj((i.name, i) for i in images)
         if pretty:
             print_pretty(res)
@@ -62,10 +71,28 @@ class ImageAPI(PartialAPI):
     async def get(self, file_name: str, outfile='', as_base64=False) -> BytesIO:
         """
         get binary data image data from misty
+
+        images are cached for a few minutes. uploading/deleting an image will clear it from the cache
         """
-        res = await self._get('images', FileName=file_name, Base64=as_base64)
-        write_outfile(outfile, res.content, as_base64)
-        return BytesIO(res.content)
+        key = file_name, as_base64
+        content = self._get_cache.get(key)
+        if content is None:
+            res = await self._get('images', FileName=file_name, Base64=as_base64)
+            content = res.content
+            if res.ok:
+                self._get_cache[key] = content
+
+        write_outfile(outfile, content, as_base64)
+        return BytesIO(content)
+
+    def _clear_cached(self, file_name: str):
+        """
+        call both before and after writing `file_name`:
+        a `get`/`list` that runs while the write is in flight would otherwise re-cache the old content
+        """
+        for as_base64 in True, False:
+            self._get_cache.pop((file_name, as_base64))
+        self.api._clear_cached_response('images/list')
 
     async def upload(self, file_name: str, *, prefix: str = '', width: Optional[int] = None,
                      height: Optional[int] = None, apply_immediately: bool = False,
@@ -79,8 +106,11 @@ class ImageAPI(PartialAPI):
         prefix, if provided, will be prepended to the name as placed on misty
         """
         payload = generate_upload_payload(prefix, file_name, apply_immediately, overwrite_existing)
-        payload.add_if_not_none(Width=width, Height=height)
-        return await self._post('images', payload)
+        payload.update(drop_none(Width=width, Height=height))
+        self._clear_cached(payload.FileName)
+        res = await self._post('images', payload)
+        self._clear_cached(payload.FileName)
+        return res
 
     async def display(self, file_name: str, alpha: float = 1.0):
         """
@@ -95,15 +125,17 @@ class ImageAPI(PartialAPI):
 
         default to turning led off
         """
-        rgb.validate()
-        return await self._post('led', rgb.json)
+        return await self._post_prepared('led', _led_json(rgb))
 
     async def delete(self, file_name: str):
-        return await self._delete('images', dict(FileName=file_name))
+        self._clear_cached(file_name)
+        res = await self._delete('images', dict(FileName=file_name))
+        self._clear_cached(file_name)
+        return res
 
     @staticmethod
     def _validate_take_picture(file_name, width, height, show_on_screen):
-        if bool(width) + bool(height) == 1:
+        if (width is None) != (height is None):
             raise ValueError("must supply either both width and height, or neither. can't supply just one")
 
         if show_on_screen and not file_name:
@@ -117,14 +149,21 @@ class ImageAPI(PartialAPI):
         if height is supplied, so must be width, and vice versa
         if you want to display on the screen, you must provide a filename
 
-        # TODO: better way return data? maybe decode the base64 vals and return them?
+        the jpg is returned as raw bytes rather than base64 in json: less to send and nothing to decode
+        raises `requests.HTTPError` if misty can't take the picture
         """
         self._validate_take_picture(file_name, width, height, show_on_screen)
-
-        payload = json_obj.from_not_none(Base64=True, FileName=file_name, Width=width, Height=height,
-                                         DisplayOnScreen=show_on_screen, OverwriteExisting=overwrite_existing)
-        res = await self._get_j('cameras/rgb', **payload)
-        return decode_data(res.base64)
+        if file_name:
+            self._clear_cached(file_name)
+
+        payload = drop_none(Base64=False, FileName=file_name, Width=width, Height=height,
+                            DisplayOnScreen=show_on_screen, OverwriteExisting=overwrite_existing)
+        res = await self._get('cameras/rgb', **payload)
+        if file_name:
+            self._clear_cached(file_name)
+        # an error's json body would otherwise be handed back as if it were the jpg
+        res.raise_for_status()
+        return BytesIO(res.content)
 
     async def start_recording_video(self, how_long_secs: Optional[int] = None):
         """
@@ -132,17 +171,34 @@ class ImageAPI(PartialAPI):
         - record up to 10 seconds
         - can only store one recording at a time
         """
+        self._cancel_stop_video_timer()
         res = await self._post('video/record/start')
         if how_long_secs:
-            how_long_secs = min(max(1, how_long_secs), 10)
-            asyncio.create_task(delay(how_long_secs, self.stop_recording_video()))
+            self._stop_video_timer = self._call_later(clamp(how_long_secs, 1, 10), self.stop_recording_video)
         return res
 
     async def stop_recording_video(self):
-        return await self._post('video/record/stop')
+        # stopping manually shouldn't leave an earlier timed stop pending - it'd cut off the next recording
+        self._cancel_stop_video_timer()
+        return await self._post_prepared('video/record/stop')
+
+    def _cancel_stop_video_timer(self):
+        if self._stop_video_timer:
+            self._stop_video_timer.cancel()
+            self._stop_video_timer = None
+
+    async def get_recorded_video(self, outfile: Optional[str] = None) -> Optional[BytesIO]:
+        """
+        if `outfile` is provided, stream the video straight to disk and return `None` rather than buffering it
+
+        raises `requests.HTTPError` if misty can't provide the video
+        """
+        if outfile:
+            (await self._download('video', outfile)).raise_for_status()
+            return None
 
-    async def get_recorded_video(self) -> BytesIO:
         res = await self._get('video')
+        res.raise_for_status()
         return BytesIO(res.content)
 
     async def get_blink_settings(self) -> BlinkSettings:
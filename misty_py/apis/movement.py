@@ -1,17 +1,18 @@
 import asyncio
+import time
 from contextlib import suppress, asynccontextmanager
-from typing import Optional, Dict, NamedTuple, List, Union
-
-import arrow
+from functools import lru_cache
+from typing import Optional, Dict, NamedTuple, Union, List
 
 from misty_py.apis.base import PartialAPI
-from misty_py.misty_ws import EventCallback
-from misty_py.subscriptions import Actuator, SubPayload
-from misty_py.utils import json_obj, first
+from misty_py.subscriptions import Actuator, SubPayload, SubId
+from misty_py.utils import first, clamp, drop_none, fire_and_forget
 
 __author__ = 'acushner'
 
 ActuatorVals = Dict[Actuator, float]
+_head_actuators = Actuator.pitch, Actuator.roll, Actuator.yaw
+_arm_actuators = {'left': Actuator.left_arm, 'right': Actuator.right_arm}
 
 
 class HeadSettings(NamedTuple):
@@ -33,20 +34,18 @@ class HeadSettings(NamedTuple):
 
     @property
     def json(self) -> Dict[str, float]:
-        names = [name for name in 'pitch roll yaw'.split() if getattr(self, name) is not None]
-        if not names:
+        # built on every head movement, so fill a single plain dict instead of merging `json_obj`s
+        vals = [(a, v) for a, v in zip(_head_actuators, (self.pitch, self.roll, self.yaw)) if v is not None]
+        if not vals:
             return {}
-        return json_obj(Velocity=self.velocity, Units='degrees', **self._get_denormalized(self, names))
-
-    @staticmethod
-    def _get_denormalized(obj, names: List[str]):
-        actuators = [Actuator[n] for n in names]
         aps = _get_calibrated_actuator_positions()
-        return json_obj((a.name.capitalize(), aps[a].denormalize(getattr(obj, a.name))) for a in actuators)
+        res = {a.name.capitalize(): aps[a].denormalize(v) for a, v in vals}
+        res.update(Velocity=self.velocity, Units='degrees')
+        return res
 
     def increment(self, act_vals: ActuatorVals):
         cur_vals = ((name, getattr(self, name)) for name in 'pitch roll yaw'.split())
-        new_vals = {name: val if val is None else min(100, max(-100, val + act_vals[Actuator[name]]))
+        new_vals = {name: val if val is None else clamp(val + act_vals[Actuator[name]], -100, 100)
                     for name, val in cur_vals}
         return type(self)(**new_vals, velocity=self.velocity)
 
@@ -65,15 +64,18 @@ class ArmSettings(NamedTuple):
 
     @property
     def json(self) -> Dict[str, float]:
+        res = {}
+        self.apply_to(res)
+        return res
+
+    def apply_to(self, payload: Dict[str, float]):
+        """write this arm's values directly into `payload` (unless invalid), e.g. to combine both arms into one call"""
         if self.invalid:
-            return {}
+            return
         side = self.side.lower()
         aps = _get_calibrated_actuator_positions()
-        res = {
-            f'{side}ArmPosition': aps[Actuator[f'{side}_arm']].denormalize(self.position),
-            f'{side}ArmVelocity': self.velocity / 10
-        }
-        return res
+        payload[f'{side}ArmPosition'] = aps[_arm_actuators[side]].denormalize(self.position)
+        payload[f'{side}ArmVelocity'] = self.velocity / 10
 
     @property
     def invalid(self) -> bool:
@@ -82,8 +84,8 @@ class ArmSettings(NamedTuple):
     def increment(self, act_vals: ActuatorVals):
         if self.invalid:
             return self
-        a = Actuator[f'{self.side.lower()}_arm']
-        return type(self)(self.side, min(100, max(-100, self.position + act_vals[a])), self.velocity)
+        a = _arm_actuators[self.side.lower()]
+        return type(self)(self.side, clamp(self.position + act_vals[a], -100, 100), self.velocity)
 
 
 _ActuatorCache: ActuatorVals
@@ -98,7 +100,8 @@ class _ActuatorCache(dict):
 
     def __init__(self, min_update_secs):
         super().__init__()
-        self._last_update = arrow.utcnow().shift(days=-1)
+        # monotonic, so clock changes can't make the cache look fresh or stale
+        self._last_update = float('-inf')
         self._min_update_secs = min_update_secs
 
     def update_from_settings(self, settings: Union[ArmSettings, HeadSettings]):
@@ -108,26 +111,23 @@ class _ActuatorCache(dict):
             self._update_from_arms_settings(settings)
 
     def _update_from_head_settings(self, settings: HeadSettings):
-        for n in 'pitch roll yaw'.split():
-            val = getattr(settings, n)
-            if val is not None:
-                self[Actuator[n]] = val
+        self.update((a, v) for a, v in zip(_head_actuators, settings[:3]) if v is not None)
 
     def _update_from_arms_settings(self, settings: ArmSettings):
         if settings.invalid:
             return
-        self[Actuator[f'{settings.side.lower()}_arm']] = settings.position
+        self[_arm_actuators[settings.side.lower()]] = settings.position
 
     def by_actuators(self, *actuators: Actuator):
         return {a: self[a] for a in actuators}
 
     def set(self, d):
         self.update(d)
-        self._last_update = arrow.utcnow()
+        self._last_update = time.monotonic()
 
     @property
     def update_needed(self):
-        return arrow.utcnow().shift(seconds=-self._min_update_secs) > self._last_update
+        return time.monotonic() - self._last_update > self._min_update_secs
 
 
 _actuator_cache = _ActuatorCache(60)
@@ -136,24 +136,35 @@ _actuator_cache = _ActuatorCache(60)
 class MovementAPI(PartialAPI):
     """control head, arms, driving, etc"""
 
+    # how long to wait for an actuator's first report after (re)subscribing. `None` waits forever
+    actuator_timeout_secs: Optional[float] = 10.0
+
+    def __init__(self, api):
+        super().__init__(api)
+        # latest raw value from each actuator, kept current by `_watch_actuators`' long-lived subscriptions
+        self._raw_actuator_vals: ActuatorVals = {}
+        self._actuator_sub_ids: List[SubId] = []
+        self._actuators_seen: Optional[Dict[Actuator, asyncio.Future]] = None
+
     async def drive(self, linear_vel_pct: int = 0, angular_vel_pct: int = 0, time_ms: Optional[int] = None):
         """
         angular_vel_pct: -100 is full speed counter-clockwise, 100 is full speed clockwise
         """
         angular_vel_pct *= -1
-        _validate_vel_pct(linear_vel_pct=linear_vel_pct, angular_vel_pct=angular_vel_pct)
-        payload = json_obj.from_not_none(LinearVelocity=linear_vel_pct, AngularVelocity=angular_vel_pct)
-        endpoint = 'drive'
-
-        if time_ms:
-            payload['TimeMS'] = time_ms
-            endpoint += '/time'
+        if _invalid_vel_pct(linear_vel_pct) or _invalid_vel_pct(angular_vel_pct):
+            _raise_invalid_vel_pct(linear_vel_pct=linear_vel_pct, angular_vel_pct=angular_vel_pct)
+        # teleop loops call this many times a second, so build a plain dict with as little work as possible
+        payload = drop_none(LinearVelocity=linear_vel_pct, AngularVelocity=angular_vel_pct)
+        if not time_ms:
+            return await self._post('drive', payload)
 
-        return await self._post(endpoint, payload)
+        payload['TimeMS'] = time_ms
+        return await self._post('drive/time', payload)
 
     async def drive_track(self, left_track_vel_pct: int = 0, right_track_vel_pct: int = 0):
         """control drive tracks individually"""
-        _validate_vel_pct(left_track_vel_pct=left_track_vel_pct, right_track_vel_pct=right_track_vel_pct)
+        if _invalid_vel_pct(left_track_vel_pct) or _invalid_vel_pct(right_track_vel_pct):
+            _raise_invalid_vel_pct(left_track_vel_pct=left_track_vel_pct, right_track_vel_pct=right_track_vel_pct)
         return await self._post('drive/track',
                                 dict(LeftTrackSpeed=left_track_vel_pct, RightTrackSpeed=right_track_vel_pct))
 
@@ -173,7 +184,9 @@ class MovementAPI(PartialAPI):
         for s in settings:
             _actuator_cache.update_from_settings(s)
 
-        payload = {k: v for arm in settings for k, v in arm.json.items()}
+        payload = {}
+        for arm in settings:
+            arm.apply_to(payload)
         if payload:
             return await self._post('arms/set', payload)
 
@@ -220,14 +233,14 @@ class MovementAPI(PartialAPI):
         """
         if everything:
             return await self.halt()
-        return await self._post('drive/stop')
+        return await self._post_prepared('drive/stop')
 
     async def halt(self):
         """stop everything"""
-        return await self._post('halt')
+        return await self._post_prepared('halt')
 
     async def drive_arc(self, heading_degrees: float, radius_m: float, time_ms: float, *, reverse: bool = False):
-        payload = json_obj(Heading=heading_degrees * -1, Radius=radius_m, TimeMs=time_ms, Reverse=reverse)
+        payload = dict(Heading=heading_degrees * -1, Radius=radius_m, TimeMs=time_ms, Reverse=reverse)
         return await self._post('drive/arc', payload)
 
     async def get_actuator_values(self, *actuators: Actuator, normalize=True, force=False) -> ActuatorVals:
@@ -235,41 +248,70 @@ class MovementAPI(PartialAPI):
         get actuator values from misty and, if set, normalize to values between
         -100 and 100 based on calibrations
 
-        `force` will make sure we go to misty to get the values
+        `force` skips the local cache and uses the latest values misty has sent
         """
-        orig_actuators = actuators or tuple(Actuator)
-        actuators = tuple(Actuator)
+        actuators = actuators or tuple(Actuator)
 
         if not force and not _actuator_cache.update_needed:
-            return _actuator_cache.by_actuators(*orig_actuators)
-
-        async def _wait_one(sp: SubPayload):
-            await submitted.wait()
-            with suppress(Exception):
-                res[sp.sub_id.sub] = sp.data.message.value
-            with suppress(KeyError):
-                expected_sub_ids.remove(sp.sub_id)
-                asyncio.create_task(sp.sub_id.unsubscribe())
+            return _actuator_cache.by_actuators(*actuators)
 
-            return not expected_sub_ids
-
-        res: ActuatorVals = {}
-        submitted = asyncio.Event()
-        ecb = EventCallback(_wait_one)
-
-        subscriptions = (self.api.ws.subscribe(a, ecb, 100) for a in (actuators if normalize else orig_actuators))
-        expected_sub_ids = set(await asyncio.gather(*subscriptions))
-        submitted.set()
-        await ecb
-
-        res = {Actuator(first(sub.ec).value): v for sub, v in res.items()}
+        # normalized reads refresh `_actuator_cache` for every actuator, so they need them all
+        await self._watch_actuators(*(Actuator if normalize else actuators))
         if not normalize:
-            return res
+            return {a: self._raw_actuator_vals[a] for a in actuators}
 
         calibrations = _get_calibrated_actuator_positions()
-        res = {k: calibrations[k].normalize(v) for k, v in res.items()}
+        res = {a: calibrations[a].normalize(v) for a, v in self._raw_actuator_vals.items()}
         _actuator_cache.set(res)
-        return {k: res[k] for k in orig_actuators}
+        return {a: res[a] for a in actuators}
+
+    async def _watch_actuators(self, *actuators: Actuator):
+        """
+        subscribe to every actuator once and stay subscribed, rather than subscribing and unsubscribing on every read
+        (re-subscribes if, e.g., `unsubscribe_all` was called or a websocket dropped)
+
+        wait until each of `actuators` has reported at least once
+        """
+        # check every sub - `is_subscribed` also clears out dropped ones
+        live = [self.api.ws.is_subscribed(sid) for sid in self._actuator_sub_ids]
+        if self._actuators_seen is None or not all(live):
+            if self._actuator_sub_ids:
+                fire_and_forget(self._unsubscribe_actuators(self._actuator_sub_ids))
+            self._raw_actuator_vals.clear()
+            self._actuator_sub_ids = []
+            # fresh futures every time we (re)subscribe so nobody waits on a report from a dropped socket
+            loop = asyncio.get_running_loop()
+            seen = self._actuators_seen = {a: loop.create_future() for a in Actuator}
+            try:
+                subs = (self.api.ws.subscribe(a, self._store_actuator_val, 100, daemon=True) for a in Actuator)
+                self._actuator_sub_ids = await asyncio.gather(*subs)
+            except Exception:
+                # don't leave concurrent readers waiting on subscriptions that never happened
+                self._actuators_seen = None
+                for f in seen.values():
+                    f.cancel()
+                raise
+        # shielded so one cancelled or timed out reader doesn't cancel the future for everyone else
+        first_reports = asyncio.gather(*(asyncio.shield(self._actuators_seen[a]) for a in actuators))
+        await asyncio.wait_for(first_reports, self.actuator_timeout_secs)
+
+    async def _unsubscribe_actuators(self, sub_ids: List[SubId]):
+        # a sub whose websocket already dropped can fail to unsubscribe - nothing left to clean up there anyway
+        await asyncio.gather(*map(self.api.ws.unsubscribe, sub_ids), return_exceptions=True)
+
+    async def close(self):
+        """unsubscribe from the actuator subscriptions `get_actuator_values` keeps open"""
+        sub_ids, self._actuator_sub_ids = self._actuator_sub_ids, []
+        self._actuators_seen = None
+        await self._unsubscribe_actuators(sub_ids)
+
+    async def _store_actuator_val(self, sp: SubPayload):
+        with suppress(Exception):
+            a = Actuator(first(sp.sub_id.sub.ec).value)
+            self._raw_actuator_vals[a] = sp.data.message.value
+            seen = self._actuators_seen[a]
+            if not seen.done():
+                seen.set_result(None)
 
     @asynccontextmanager
     async def reset_to_orig(self, velocity=60, ignore=False):
@@ -308,12 +350,11 @@ class PosZeroNeg(NamedTuple):
     neg: float  # misty value when setting to -100 via the api
 
     def normalize(self, val):
-        if val < self.zero and self.pos < self.zero:
-            return abs(self._normalize(self.pos, val))
-        return -abs(self._normalize(self.neg, val))
-
-    def _normalize(self, end, val):
-        return (val - self.zero) / (end - self.zero) * 100
+        # runs for every actuator on every read, so keep it to one branch and no extra calls
+        zero = self.zero
+        if val < zero and self.pos < zero:
+            return abs((val - zero) / (self.pos - zero) * 100)
+        return -abs((val - zero) / (self.neg - zero) * 100)
 
     def denormalize(self, val):
         if val > 0:
@@ -339,7 +380,7 @@ async def calibrate_misty():
     async def _head(*_args, **_kwargs):
         await api.movement.move_head(*_args, **_kwargs)
         await asyncio.sleep(3)
-        return (await api.movement.get_actuator_values(normalize=False))[a]
+        return (await api.movement.get_actuator_values(a, normalize=False, force=True))[a]
 
     for a in Actuator.pitch, Actuator.roll, Actuator.yaw:
         kwargs = {a.name: 110, 'velocity': 60}
@@ -351,10 +392,12 @@ async def calibrate_misty():
         zero = await _head(0, 0, 0, 50)
         res[a] = PosZeroNeg(pos, zero, neg)
 
+    arms = Actuator.left_arm, Actuator.right_arm
+
     async def _arms(**_kwargs):
         await api.movement.move_arms(**_kwargs)
         await asyncio.sleep(2)
-        positions = await api.movement.get_actuator_values(normalize=False)
+        positions = await api.movement.get_actuator_values(*arms, normalize=False, force=True)
         return positions[Actuator.left_arm], positions[Actuator.right_arm]
 
     l_pos, r_pos = await _arms(l_position=110, r_position=110, l_velocity=80, r_velocity=80)
@@ -379,7 +422,9 @@ default_actuator_calibrations = {
 }
 
 
+@lru_cache(maxsize=1)
 def _get_calibrated_actuator_positions() -> Dict[Actuator, PosZeroNeg]:
+    # used on every head/arm movement and actuator read. call `cache_clear` to pick up new calibrations
     try:
         from misty_py.utils.local_conf import actuator_calibrations
     except (ImportError, ModuleNotFoundError):
@@ -392,12 +437,14 @@ def _get_calibrated_actuator_positions() -> Dict[Actuator, PosZeroNeg]:
     return {Actuator[name]: PosZeroNeg(*vals) for name, vals in actuator_calibrations.items()}
 
 
-def _validate_vel_pct(**vel_pcts):
-    fails = {name: val for name, val in vel_pcts.items()
-             if val is not None
-             and not -100 <= val <= 100}
-    if fails:
-        raise ValueError(f'invalid value for vel_pct: {fails}, must be in range [-100, 100] or `None`')
+def _invalid_vel_pct(val) -> bool:
+    return val is not None and not -100 <= val <= 100
+
+
+def _raise_invalid_vel_pct(**vel_pcts):
+    # only called once a check has failed - the drive commands check inline so the happy path allocates nothing
+    fails = {name: val for name, val in vel_pcts.items() if _invalid_vel_pct(val)}
+    raise ValueError(f'invalid value for vel_pct: {fails}, must be in range [-100, 100] or `None`')
 
 
 def __main():
@@ -1,10 +1,14 @@
+import asyncio
 from abc import ABC, abstractmethod
+from contextlib import suppress, AsyncExitStack
 from io import BytesIO
+from itertools import groupby
+from typing import Set
 
 from misty_py.apis.base import PartialAPI
 from misty_py.misty_ws import EventCallback
 from misty_py.subscriptions import SubPayload, SubType
-from misty_py.utils import Coords
+from misty_py.utils import Coords, cached_property
 
 __author__ = 'acushner'
 
@@ -14,68 +18,120 @@ class _SlamHelper(PartialAPI, ABC):
     context manager to handle initializing and stopping slam functionality
 
     used by the NavigationAPI
+
+    stopping is delayed by `stop_delay_secs` so that back-to-back uses share a single start/stop.
+    `flush` (called by `MistyAPI.aclose`) stops right away instead
     """
 
-    def __init__(self, api, endpoint: str, timeout_secs=15.0):
+    def __init__(self, api, endpoint: str, timeout_secs=15.0, stop_delay_secs=0.5):
         super().__init__(api)
-        self._endpoint = endpoint
+        self._start_path = f'slam/{endpoint}/start'
+        self._stop_path = f'slam/{endpoint}/stop'
         self._num_current_slam_streams = 0
         self._ready_cb = EventCallback(self._sensor_ready, timeout_secs)
+        self._lock = asyncio.Lock()
+        self._running = False
+        self._stop_delay_secs = stop_delay_secs
+        self._pending_stops: Set[asyncio.Task] = set()
 
     @abstractmethod
     async def _sensor_ready(self, sp: SubPayload):
         """handler func that indicates when the sensor is ready"""
 
     async def start(self):
-        self._ready_cb.clear()
-        await self._post(f'slam/{self._endpoint}/start')
+        await self._post(self._start_path)
 
     async def stop(self):
-        return await self._post(f'slam/{self._endpoint}/stop')
+        self._running = False
+        return await self._post(self._stop_path)
 
     async def reset(self):
         return await self._post('slam/reset')
 
+    async def _stop_if_unused(self):
+        async with self._lock:
+            if self._running and not self._num_current_slam_streams:
+                await self.stop()
+
+    async def _delayed_stop(self):
+        try:
+            await asyncio.sleep(self._stop_delay_secs)
+        finally:
+            # also runs when cancelled, e.g. by `flush` or by `asyncio.run` shutting down,
+            # so slam isn't left running on misty
+            await self._stop_if_unused()
+
+    async def flush(self):
+        """stop now if a delayed stop is pending"""
+        pending = list(self._pending_stops)
+        for t in pending:
+            t.cancel()
+        with suppress(asyncio.CancelledError):
+            await asyncio.gather(*pending)
+
     async def __aenter__(self):
-        self._num_current_slam_streams += 1
-        if self._num_current_slam_streams == 1:
-            await self.start()
-            async with self.api.ws.sub_unsub(SubType.self_state, self._ready_cb):
-                await self._ready_cb
+        async with self._lock:
+            self._num_current_slam_streams += 1
+            if self._running:
+                return
+
+            # misty starts up while we're connecting to the websocket instead of after
+            self._ready_cb.clear()
+            start = asyncio.create_task(self.start())
+            try:
+                async with self.api.ws.sub_unsub(SubType.self_state, self._ready_cb):
+                    await start
+                    await self._ready_cb
+            except BaseException:
+                self._num_current_slam_streams -= 1
+                # cancelling can't reach a start request already running in the thread pool,
+                # so let it finish and then stop whatever it started rather than leave slam running on misty
+                with suppress(Exception):
+                    await asyncio.shield(start)
+                    await asyncio.shield(self.stop())
+                raise
+            self._running = True
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         self._num_current_slam_streams -= 1
         if self._num_current_slam_streams == 0:
-            await self.stop()
+            t = asyncio.create_task(self._delayed_stop())
+            self._pending_stops.add(t)
+            t.add_done_callback(self._pending_stops.discard)
+
 
+# `_sensor_ready` runs on every self_state message, so the statuses to check for are built once, up front
 
 class _SlamMapping(_SlamHelper):
+    _ready_statuses = frozenset(('Ready', 'Exploring', 'HasPose', 'Streaming'))
+
     def __init__(self, api):
         super().__init__(api, 'map')
 
     async def _sensor_ready(self, sp: SubPayload):
         ss = sp.data.message.slamStatus
-        return (ss.runMode == 'Exploring'
-                and all(v in ss.statusList for v in 'Ready Exploring HasPose Streaming'.split()))
+        return ss.runMode == 'Exploring' and self._ready_statuses.issubset(ss.statusList)
 
 
 class _SlamStreaming(_SlamHelper):
+    _ready_statuses = frozenset(('Ready', 'Streaming'))
+
     def __init__(self, api):
         super().__init__(api, 'streaming')
 
     async def _sensor_ready(self, sp: SubPayload):
-        ss = sp.data.message.slamStatus
-        return all(v in ss.statusList for v in 'Ready Streaming'.split())
+        return self._ready_statuses.issubset(sp.data.message.slamStatus.statusList)
 
 
 class _SlamTracking(_SlamHelper):
+    _ready_statuses = frozenset(('Ready', 'Tracking', 'HasPose', 'Streaming'))
+
     def __init__(self, api):
         super().__init__(api, 'track')
 
     async def _sensor_ready(self, sp: SubPayload):
         ss = sp.data.message.slamStatus
-        return (ss.runMode == 'Tracking'
-                and all(v in ss.statusList for v in ('Ready', 'Tracking', 'HasPose', 'Streaming')))
+        return ss.runMode == 'Tracking' and self._ready_statuses.issubset(ss.statusList)
 
 
 class NavigationAPI(PartialAPI):
@@ -85,11 +141,25 @@ class NavigationAPI(PartialAPI):
     can also take depth/fisheye pics
     """
 
-    def __init__(self, api):
-        super().__init__(api)
-        self.slam_streaming = _SlamStreaming(api)
-        self.slam_mapping = _SlamMapping(api)
-        self.slam_tracking = _SlamTracking(api)
+    # helpers are created on first use. besides skipping unused ones, this means their locks are made
+    # inside the running loop, which matters on python < 3.10 where `asyncio.Lock` binds to a loop when created
+
+    @cached_property
+    def slam_streaming(self) -> _SlamStreaming:
+        return _SlamStreaming(self.api)
+
+    @cached_property
+    def slam_mapping(self) -> _SlamMapping:
+        return _SlamMapping(self.api)
+
+    @cached_property
+    def slam_tracking(self) -> _SlamTracking:
+        return _SlamTracking(self.api)
+
+    async def close(self):
+        """stop any slam sensors that are only waiting out their stop delay"""
+        helpers = (v for v in vars(self).values() if isinstance(v, _SlamHelper))
+        await asyncio.gather(*(h.flush() for h in helpers))
 
     async def reset_slam(self):
         return await self._post('slam/reset')
@@ -100,12 +170,34 @@ class NavigationAPI(PartialAPI):
 
     async def take_fisheye_pic(self) -> BytesIO:
         async with self.slam_streaming:
-            res = await self._get('cameras/fisheye')
-            return BytesIO(res.content)
+            return await self._get_fisheye_pic()
+
+    async def _get_fisheye_pic(self) -> BytesIO:
+        res = await self._get('cameras/fisheye')
+        return BytesIO(res.content)
 
     async def get_map(self):
         return await self._get_j('slam/map')
 
+    async def capture_all(self, depth=True, fisheye=True, slam_map=True):
+        """
+        take depth/fisheye pics and get the map concurrently, starting slam streaming only once.
+        if `slam_map` is set, mapping runs alongside streaming so the map comes from the same session
+
+        return `(depth_pic, fisheye_pic, slam_map)` with `None` for anything not requested
+        """
+
+        async def _skip():
+            return None
+
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(self.slam_streaming)
+            if slam_map:
+                await stack.enter_async_context(self.slam_mapping)
+            return await asyncio.gather(self._get_j('cameras/depth') if depth else _skip(),
+                                        self._get_fisheye_pic() if fisheye else _skip(),
+                                        self.get_map() if slam_map else _skip())
+
     async def map(self):
         """# algo for misty to move around slowly mapping her environment"""
         # TODO: implement
@@ -116,10 +208,17 @@ class NavigationAPI(PartialAPI):
             await self._post('drive/coordinates', dict(Destination=Coords.format(coords)))
 
     async def follow_path(self, *coords: Coords):
+        # repeated consecutive waypoints are no-ops for misty, so don't send them
+        coords = [c for c, _ in groupby(coords)]
+
+        # a single point is just a destination. either way, only enter `slam_tracking` once
+        if len(coords) == 1:
+            endpoint, payload = 'drive/coordinates', dict(Destination=Coords.format(*coords))
+        else:
+            endpoint, payload = 'drive/path', dict(Path=Coords.format(*coords))
+
         async with self.slam_tracking:
-            if len(coords) == 1:
-                return await self.drive_to_coordinates(*coords)
-            return await self._post('drive/path', dict(Path=Coords.format(*coords)))
+            return await self._post(endpoint, payload)
 
 
 def __main():
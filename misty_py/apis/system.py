@@ -1,9 +1,10 @@
-from typing import NamedTuple, Dict, Optional
-
-import arrow
+from typing import NamedTuple, Dict, Optional, TYPE_CHECKING
 
 from misty_py.apis.base import PartialAPI
-from misty_py.utils import json_obj
+from misty_py.utils import json_obj, drop_none, json_loads
+
+if TYPE_CHECKING:
+    import arrow
 
 __author__ = 'acushner'
 
@@ -28,23 +29,30 @@ class SystemAPI(PartialAPI):
     """
 
     async def clear_display_text(self):
-        return await self._post('text/clear')
+        return await self._post_prepared('text/clear')
 
     async def get_wifi_networks(self) -> Dict[str, str]:
-        networks = await self._get_j('networks')
+        networks = await self._get_j('networks', _cache=True)
         return {n.ssid: n for n in networks}
 
     async def connect_wifi(self, ssid):
         """connect to known wifi"""
-        return await self._post('networks', json_obj(NetworkId=ssid))
+        res = await self._post('networks', json_obj(NetworkId=ssid))
+        # only once misty's done: a `get_wifi_networks` running in the meantime would re-cache the old list
+        self.api._clear_cached_response('networks')
+        return res
 
     async def set_wifi_network(self, name, password):
         """set up with username and password"""
         payload = dict(NetworkName=name, Password=password)
-        return await self._post('network', payload)
+        res = await self._post('network', payload)
+        self.api._clear_cached_response('networks')
+        return res
 
     async def forget_wifi(self, ssid):
-        return await self._delete('networks', json_obj(NetworkId=ssid))
+        res = await self._delete('networks', json_obj(NetworkId=ssid))
+        self.api._clear_cached_response('networks')
+        return res
 
     async def scan_wifi(self):
         """find available wifi networks"""
@@ -52,32 +60,31 @@ class SystemAPI(PartialAPI):
 
     @property
     async def battery_info(self) -> BatteryInfo:
-        return BatteryInfo.from_meta(await self._get_j('battery'))
+        return BatteryInfo.from_meta(await self._get_j('battery', _cache=True))
 
     @property
     async def device_info(self):
-        return await self._get_j('device')
+        return await self._get_j('device', _cache=True)
 
     async def help(self, endpoint: Optional[str] = None):
         """specs for the system at large"""
-        return await self._get_j('help', **json_obj.from_not_none(command=endpoint))
+        return await self._get_j('help', **drop_none(command=endpoint))
 
-    async def get_logs(self, date: arrow.Arrow = arrow.now()) -> str:
-        params = json_obj()
-        if date:
-            params.date = date.format('YYYY/MM/DD')
-        return (await self._get('logs', **params)).json()['result']
+    async def get_logs(self, date: Optional['arrow.Arrow'] = None) -> str:
+        """if `date` isn't provided, misty returns today's logs"""
+        params = {} if date is None else dict(date=date.format('YYYY/MM/DD'))
+        return json_loads((await self._get('logs', **params)).content)['result']
 
     @property
     async def log_level(self) -> str:
-        return (await self._get('logs/level')).json()['result']
+        return json_loads((await self._get('logs/level')).content)['result']
 
     async def set_log_level(self, log_level: str):
         return await self._post('logs/level', json_obj(LogLevel=log_level))
 
     @property
     async def is_update_available(self) -> bool:
-        return (await self._get('system/updates')).json()['result']
+        return json_loads((await self._get('system/updates')).content)['result']
 
     async def perform_system_update(self):
         return await self._post('system/update')
@@ -91,7 +98,7 @@ class SystemAPI(PartialAPI):
 
     @property
     async def websocket_version(self):
-        return (await self._get('websocket/version')).json()['result']
+        return json_loads((await self._get('websocket/version')).content)['result']
 
     async def send_to_backpack(self, msg: str):
         """not sure what kind of data/msg we can send - perhaps Base64 encode to send binary data?"""
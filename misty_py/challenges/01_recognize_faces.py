@@ -74,9 +74,8 @@ async def _handle_face_recognition(sp: SubPayload):
 
 async def _init_face_recognition() -> EventCallback:
     print('starting face recognition')
-    await api.faces.start_recognition()
     eh = EventCallback(_handle_face_recognition)
-    await api.ws.subscribe(SubType.face_recognition, eh)
+    await asyncio.gather(api.faces.start_recognition(), api.ws.subscribe(SubType.face_recognition, eh))
     return eh
 
 
@@ -10,7 +10,7 @@ import websockets
 
 from misty_py.subscriptions import SubType, SubId, SubPayload, HandlerType, Sub, LLSubType
 from .utils import json_obj
-from .utils.core import InstanceCache, init_log, shield_async
+from .utils.core import InstanceCache, init_log, shield_async, fire_and_forget, daemon_task
 
 __author__ = 'acushner'
 
@@ -134,18 +134,20 @@ class MistyWS(metaclass=InstanceCache):
         return next(self._count)
 
     async def subscribe(self, sub: Union[SubType, LLSubType, Sub], handler: HandlerType = debug_handler,
-                        debounce_ms: int = 250) -> Union[SubId, List[SubId]]:
+                        debounce_ms: int = 250, *, once=False, daemon=False) -> Union[SubId, List[SubId]]:
         """
         subscribe to events from misty
 
         handler will be invoked every time an event is received
+        if `once` is set, it's only invoked for the first event, after which we unsubscribe
+        `daemon` subscriptions are meant to stay open indefinitely, so `async_run` won't wait on them
         """
         with suppress(TypeError):
             if issubclass(sub, LLSubType):
                 raise ValueError(f'cannot subscribe via type LLSubType {sub}, use SubType instead')
 
         if isinstance(sub, SubType):
-            coros = (self.subscribe(s, handler, debounce_ms) for s in sub.lower_level_subs)
+            coros = (self.subscribe(s, handler, debounce_ms, once=once, daemon=daemon) for s in sub.lower_level_subs)
             return await asyncio.gather(*coros)
 
         if isinstance(sub, LLSubType):
@@ -153,11 +155,12 @@ class MistyWS(metaclass=InstanceCache):
 
         sub_id = SubId.create(sub, self.api)
         ws = await websockets.connect(self._endpoint)
-        self._tasks[sub_id] = TaskInfo(asyncio.create_task(self._handle(ws, handler, sub_id)), ws)
+        create = daemon_task if daemon else asyncio.create_task
+        self._tasks[sub_id] = TaskInfo(create(self._handle(ws, handler, sub_id, once)), ws)
 
         payload = sub_id.to_json(debounce_ms)
-        log.info(f'subscribing: {payload}')
-        asyncio.create_task(ws.send(payload.json))
+        log.info('subscribing: %s', payload)
+        fire_and_forget(ws.send(payload.json))
 
         return sub_id
 
@@ -177,7 +180,7 @@ class MistyWS(metaclass=InstanceCache):
 
         can unsubscribe either by `SubType`, `SubId`, or str containing the event_name
         """
-        log.info(f'unsubscribing: {sub_id}')
+        log.info('unsubscribing: %s', sub_id)
         if isinstance(sub_id, str):
             return await self._unsubscribe_str(sub_id)
 
@@ -198,6 +201,16 @@ class MistyWS(metaclass=InstanceCache):
         log.info('unsubscribed')
         return True
 
+    def is_subscribed(self, sub_id: SubId) -> bool:
+        ti = self._tasks.get(sub_id)
+        if ti is None:
+            return False
+        if ti.task.done():
+            # the websocket dropped. forget about it so it can be subscribed to again
+            del self._tasks[sub_id]
+            return False
+        return True
+
     async def unsubscribe_all(self):
         """cancel all active subscriptions"""
         coros = (sid.unsubscribe() for sid in self._tasks)
@@ -219,7 +232,7 @@ class MistyWS(metaclass=InstanceCache):
             coros = (shield_async(self.unsubscribe(sid)) for sid in sub_id_or_ids)
             await asyncio.gather(*coros)
 
-    async def _handle(self, ws, handler: HandlerType, sub_id):
+    async def _handle(self, ws, handler: HandlerType, sub_id, once=False):
         """
         take messages from the websocket and pass them on to the handler
         additionally, skip the registration message
@@ -239,4 +252,8 @@ class MistyWS(metaclass=InstanceCache):
                 raise SubscriptionError(f'failed to subscribe: {msg}')
 
             sp = self.api.subscription_data[sub_id.sub] = SubPayload.from_data(o, sub_id)
-            create_task(handler(sp))
+            fire_and_forget(handler(sp))
+            if once:
+                # `unsubscribe` cancels this task, so let it run on its own
+                fire_and_forget(sub_id.unsubscribe())
+                return
@@ -4,13 +4,14 @@ from abc import abstractmethod
 from enum import Enum
 from functools import lru_cache
 from itertools import count
-from typing import NamedTuple, Optional, Callable, Awaitable, FrozenSet, Dict, Any, Union
-
-import arrow
+from typing import NamedTuple, Optional, Callable, Awaitable, FrozenSet, Dict, Any, Union, TYPE_CHECKING
 
 from misty_py.utils import json_obj
 from misty_py.utils.core import classproperty
 
+if TYPE_CHECKING:
+    import arrow
+
 __author__ = 'acushner'
 
 HandlerType = Callable[['SubPayload'], Awaitable[Any]]
@@ -277,6 +278,8 @@ class SubPayload(NamedTuple):
 
     @classmethod
     def from_data(cls, o: json_obj, sid: SubId):
+        # imported here so `import misty_py` doesn't pay for arrow until the first message arrives
+        import arrow
         return cls(arrow.now(), o, sid)
 
 
@@ -1,23 +1,41 @@
 import asyncio
 import json
 import logging
+import time
+import weakref
 from abc import abstractmethod, ABC
 from asyncio import Future
 from contextlib import suppress
 from functools import wraps
 from pathlib import Path
 from typing import NamedTuple, Dict, Optional, Union, List, Set, Any, Coroutine
-from collections import ChainMap, defaultdict
+from collections import ChainMap, defaultdict, OrderedDict
 from PIL import Image as PImage
-from base64 import b64decode, b64encode
 from io import BytesIO
 
 __all__ = (
-    'Coords', 'InstanceCache', 'json_obj', 'RestAPI', 'JSONObjOrObjs', 'decode_img',
-    'save_data_locally', 'generate_upload_payload', 'delay', 'asyncpartial', 'classproperty', 'wait_first',
-    'async_run', 'format_help', 'wait_in_order', 'wait_for_group', 'first', 'init_log', 'shield_async'
+    'Coords', 'InstanceCache', 'TTLCache', 'json_obj', 'clamp', 'RestAPI', 'JSONObjOrObjs', 'decode_img',
+    'save_data_locally', 'generate_upload_payload', 'delay', 'asyncpartial', 'classproperty', 'cached_property',
+    'wait_first', 'async_run', 'format_help', 'wait_in_order', 'wait_for_group', 'first', 'init_log', 'shield_async',
+    'json_loads', 'json_dumps', 'drop_none', 'install_fast_loop',
+    'fire_and_forget', 'daemon_task'
 )
 
+try:
+    # considerably faster than the stdlib for the larger responses, e.g. `list`s, `help`, and slam maps
+    from orjson import loads as json_loads, dumps as json_dumps
+except ModuleNotFoundError:
+    json_loads = json.loads
+
+    def json_dumps(o) -> bytes:
+        return json.dumps(o).encode()
+
+try:
+    # simd-accelerated drop-in for the stdlib. pictures, maps, and uploads are all base64-encoded
+    from pybase64 import b64decode, b64encode
+except ModuleNotFoundError:
+    from base64 import b64decode, b64encode
+
 
 async def shield_async(coro):
     """for some reason, `await create_task(shield(coro))` just doesn't work. so we have this now."""
@@ -29,6 +47,32 @@ async def shield_async(coro):
     return asyncio.create_task(_wrap())
 
 
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def fire_and_forget(coro) -> asyncio.Task:
+    """
+    schedule `coro` without awaiting it
+
+    the loop only keeps weak refs to its tasks, so hold onto it here until it's done
+    """
+    t = asyncio.create_task(coro)
+    _background_tasks.add(t)
+    t.add_done_callback(_background_tasks.discard)
+    return t
+
+
+# long-lived tasks, e.g. standing websocket subscriptions, that `async_run` shouldn't wait to finish
+_daemon_tasks = weakref.WeakSet()
+
+
+def daemon_task(coro) -> asyncio.Task:
+    """create a task that's never expected to finish on its own, so `async_run` won't wait on it"""
+    t = asyncio.create_task(coro)
+    _daemon_tasks.add(t)
+    return t
+
+
 def init_log(name, level=logging.INFO):
     """create logger using consistent settings"""
     log = logging.getLogger(name)
@@ -47,6 +91,20 @@ def first(v):
     return next(iter(v))
 
 
+def drop_none(**key_value_pairs) -> dict:
+    """
+    plain dict of only the items that aren't `None`
+
+    cheaper than `json_obj.from_not_none` for payloads that don't need `.` access
+    """
+    return {k: v for k, v in key_value_pairs.items() if v is not None}
+
+
+def clamp(val, lo, hi):
+    """restrict `val` to the range [lo, hi]"""
+    return lo if val < lo else hi if val > hi else val
+
+
 class classproperty:
     def __init__(self, f):
         self.f = f
@@ -55,6 +113,29 @@ class classproperty:
         return self.f(cls)
 
 
+class cached_property:
+    """
+    compute once per instance and store the result in the instance's `__dict__`
+
+    as this is a non-data descriptor, later lookups find the stored value and skip the descriptor entirely.
+    (`functools.cached_property` does this too, but is only available in 3.8+)
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.name = f.__name__
+        self.__doc__ = f.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, cls):
+        if instance is None:
+            return self
+        res = instance.__dict__[self.name] = self.f(instance)
+        return res
+
+
 def asyncpartial(coro, *args, **kwargs):
     @wraps(coro)
     async def wrapped(*a, **kw):
@@ -72,32 +153,39 @@ class Coords(NamedTuple):
 
     @staticmethod
     def format(*coords: 'Coords'):
-        return ','.join(map(str, coords))
+        # unpack directly rather than calling `__str__` for every point - paths can be long
+        return ','.join([f'{x}:{y}' for x, y in coords])
 
 
 # ======================================================================================================================
 
-identity = lambda x: x
-
-
 class json_obj(dict):
     """add `.` accessibility to dicts"""
 
+    # attributes all live in the dict itself, so there's no need for a per-instance `__dict__`.
+    # there can be a great many of these - one per element of every parsed response
+    __slots__ = ()
+
     def __new__(cls, dict_or_list: Optional[Union[dict, list]] = None, **kwargs):
         if isinstance(dict_or_list, list):
             if kwargs:
                 raise ValueError('cannot pass list with keyword args')
-            return [(json_obj if isinstance(e, (dict, list)) else identity)(e) for e in dict_or_list]
+            return [_wrap_json(e) for e in dict_or_list]
 
-        new_dict = kwargs
         if isinstance(dict_or_list, dict):
-            new_dict = ChainMap(kwargs, dict_or_list)
+            items = dict_or_list.items()
         elif dict_or_list is not None:
             # try to process as an iterable of tuples, a la regular dict creation
-            new_dict = ChainMap(kwargs, {k: v for (k, v) in dict_or_list})
+            items = dict_or_list
+        else:
+            items = ()
 
         res = super().__new__(cls)
-        res._add(**new_dict)
+        # fill directly, with no intermediate merged dict. kwargs go last so they take precedence.
+        # values that are already `json_obj`s, e.g. when re-keying a parsed list, aren't re-wrapped
+        dict.update(res, ((k, _wrap_json(v)) for k, v in items))
+        if kwargs:
+            dict.update(res, ((k, _wrap_json(v)) for k, v in kwargs.items()))
         return res
 
     def __init__(self, _=None, **__):
@@ -112,7 +200,7 @@ class json_obj(dict):
 
     @classmethod
     def from_str(cls, s: str):
-        return cls(json.loads(s))
+        return cls(json_loads(s))
 
     @property
     def json(self) -> str:
@@ -128,10 +216,7 @@ class json_obj(dict):
     def _add(self, _if_not_none=False, **key_value_pairs):
         for k, v in key_value_pairs.items():
             if not _if_not_none or v is not None:
-                if isinstance(v, (list, dict)):
-                    self[k] = json_obj(v)
-                else:
-                    self[k] = v
+                self[k] = _wrap_json(v)
 
     def __setattr__(self, key, value):
         self._add(**{key: value})
@@ -163,13 +248,24 @@ class json_obj(dict):
 JSONObjOrObjs = Union[json_obj, List[json_obj]]
 
 
+def _wrap_json(v):
+    """
+    convert dicts/lists to `json_obj`s
+
+    values that are already `json_obj`s are kept as is, e.g. when re-keying the results of a `list` call
+    """
+    if isinstance(v, (list, dict)) and not isinstance(v, json_obj):
+        return json_obj(v)
+    return v
+
+
 class RestAPI(ABC):
     @abstractmethod
     def _get(self, endpoint, *, _headers=None, **params):
         """REST GET"""
 
     @abstractmethod
-    def _get_j(self, endpoint, *, _headers=None, **params) -> JSONObjOrObjs:
+    def _get_j(self, endpoint, *, _headers=None, _cache=False, **params) -> JSONObjOrObjs:
         """REST GET - return as dict"""
 
     @abstractmethod
@@ -209,13 +305,59 @@ class InstanceCache(type):
         return res
 
 
+class TTLCache:
+    """
+    bounded mapping that evicts least-recently-used entries and, optionally, entries older than `ttl_secs`
+
+    used to avoid asking misty for data we've recently received
+    """
+
+    def __init__(self, maxsize: int = 128, ttl_secs: Optional[float] = None):
+        self._data = OrderedDict()
+        self._maxsize = maxsize
+        self._ttl_secs = ttl_secs
+
+    def get(self, key, default=None):
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return default
+
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        expires = None if self._ttl_secs is None else time.monotonic() + self._ttl_secs
+        self._data[key] = expires, value
+        self._data.move_to_end(key)
+        if len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        res = self._data.pop(key, None)
+        return default if res is None else res[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
 def encode_data(filename_or_bytes: Union[str, bytes], limit: int = None) -> str:
     """transform either a filename or bytes to base64 encoding"""
     data = filename_or_bytes
     if isinstance(filename_or_bytes, str):
         with open(filename_or_bytes, 'rb') as f:
-            data = f.read()
-    return b64encode(data[:limit]).decode()
+            # only read what will be sent
+            data = f.read(limit)
+    elif limit is not None:
+        data = memoryview(data)[:limit]
+    return b64encode(data).decode()
 
 
 def decode_data(data: Union[str, bytes, BytesIO]) -> BytesIO:
@@ -299,7 +441,8 @@ async def wait_first(*coros: Optional[Union[Future, Coroutine]],
 
     by default, cancel all pending futures
     """
-    coros = [c for c in coros if c]
+    # `asyncio.wait` no longer accepts bare coroutines (3.11+)
+    coros = [asyncio.ensure_future(c) for c in coros if c]
     if not coros:
         return DonePending(set(), set())
 
@@ -340,6 +483,8 @@ def format_help(help):
 async def _await_all():
     """await any remaining tasks"""
     for t in asyncio.all_tasks():
+        if t in _daemon_tasks:
+            continue
         with suppress(Exception):
             await t
 
@@ -349,6 +494,20 @@ async def _async_run_helper(coro):
     await _await_all()
 
 
+def install_fast_loop() -> bool:
+    """
+    have event loops created from now on use uvloop, if it's installed (it isn't available on windows)
+
+    return whether it was installed
+    """
+    try:
+        import uvloop
+    except ModuleNotFoundError:
+        return False
+    uvloop.install()
+    return True
+
+
 def async_run(coro):
     """
     run coro and then drain any pending tasks
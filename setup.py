@@ -21,6 +21,7 @@ setup(
     long_description_content_type="text/markdown",
 
     install_requires=['arrow', 'requests', 'websockets', 'Pillow'],
+    extras_require={'speedups': ['orjson', 'pybase64', 'uvloop']},
     classifiers=[
         "Programming Language :: Python :: 3"
         "License :: OSI Approved :: MIT License",